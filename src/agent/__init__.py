@@ -1,3 +1,5 @@
 from .repository_agent import RepositoryAgent
+from .spec_index import SpecIndex
+from .budget import RunBudget, RunResult, BudgetExceededError
 
-__all__ = ['RepositoryAgent'] 
\ No newline at end of file
+__all__ = ['RepositoryAgent', 'SpecIndex', 'RunBudget', 'RunResult', 'BudgetExceededError']
@@ -0,0 +1,207 @@
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.tools.base import ToolException
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceededError(Exception):
+    """Raised when a run is cancelled or exceeds its deadline or token budget"""
+
+    def __init__(self, cause: str):
+        super().__init__(cause)
+        self.cause = cause
+
+
+class ToolTimeoutError(ToolException):
+    """Raised when a single tool call exceeds its timeout, reported back to the agent"""
+
+
+class RunResult(BaseModel):
+    """Outcome of a repository run, truthy when the run succeeded"""
+    success: bool
+    timed_out: bool = False
+    cause: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+class RunBudget:
+    """
+    Deadline, token budget and cancellation token of a run.
+
+    Budgets are made available to tools through `current_budget`, which is
+    copied into worker threads by `asyncio.to_thread`, so blocking work can
+    cooperatively stop once the run is cancelled. A child budget has its own
+    deadline and cancellation but shares the token accounting of its parent.
+    """
+
+    def __init__(self,
+                 timeout: Optional[float] = None,
+                 token_budget: Optional[int] = None,
+                 tool_timeout: Optional[float] = None,
+                 parent: Optional["RunBudget"] = None):
+        self._parent = parent
+        self._deadline = time.monotonic() + timeout if timeout is not None else None
+        self._token_budget = token_budget
+        self._tokens_used = 0
+        self._cancel_event = threading.Event()
+        self._cause: Optional[str] = None
+        self._lock = threading.Lock()
+        self._workers: List[threading.Event] = []
+        self.tool_timeout = tool_timeout if tool_timeout is not None else (parent.tool_timeout if parent else None)
+
+    def child(self, timeout: Optional[float] = None) -> "RunBudget":
+        return RunBudget(timeout=timeout, parent=self)
+
+    @property
+    def tokens_used(self) -> int:
+        return self._tokens_used
+
+    @property
+    def cause(self) -> Optional[str]:
+        if self._cause is None and self._parent is not None:
+            return self._parent.cause
+        return self._cause
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the nearest deadline, None when unbounded"""
+        remaining = None
+        if self._deadline is not None:
+            remaining = max(0.0, self._deadline - time.monotonic())
+        if self._parent is not None:
+            parent_remaining = self._parent.remaining()
+            if parent_remaining is not None:
+                remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def timeout_for(self, limit: Optional[float] = None) -> Optional[float]:
+        """Clamp a per-call timeout to the time left in the budget"""
+        remaining = self.remaining()
+        if limit is None:
+            return remaining
+        return limit if remaining is None else min(limit, remaining)
+
+    def cancel(self, cause: str) -> None:
+        with self._lock:
+            if self._cause is None:
+                self._cause = cause
+        self._cancel_event.set()
+
+    def charge(self, tokens: int) -> None:
+        with self._lock:
+            self._tokens_used += tokens
+        if self._parent is not None:
+            self._parent.charge(tokens)
+
+    def track_worker(self, done: threading.Event) -> None:
+        """Register a worker thread that sets `done` once it has finished"""
+        with self._lock:
+            self._workers = [worker for worker in self._workers if not worker.is_set()]
+            self._workers.append(done)
+
+    def wait_for_workers(self, timeout: float) -> bool:
+        """Block until all tracked workers finished, False if some are still running after the timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            workers = list(self._workers)
+        return all(worker.wait(max(0.0, deadline - time.monotonic())) for worker in workers)
+
+    def check(self) -> None:
+        """Raise BudgetExceededError if the run should stop"""
+        if self._cancel_event.is_set():
+            raise BudgetExceededError(self._cause)
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            self.cancel("deadline exceeded")
+            raise BudgetExceededError(self._cause)
+        if self._token_budget is not None and self._tokens_used >= self._token_budget:
+            self.cancel(f"token budget of {self._token_budget} exhausted")
+            raise BudgetExceededError(self._cause)
+        if self._parent is not None:
+            self._parent.check()
+
+
+current_budget: ContextVar[Optional[RunBudget]] = ContextVar("current_budget", default=None)
+
+
+def check_budget() -> None:
+    """Check the budget of the current run, if any"""
+    budget = current_budget.get()
+    if budget is not None:
+        budget.check()
+
+
+def budget_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks that enforce the budget of the current run on LLM calls"""
+    budget = current_budget.get()
+    return [BudgetCallbackHandler(budget)] if budget is not None else []
+
+
+class BudgetCallbackHandler(BaseCallbackHandler):
+    """Checks the budget before each LLM call and charges the tokens it used"""
+    raise_error: bool = True
+
+    def __init__(self, budget: RunBudget):
+        self._budget = budget
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._budget.check()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any) -> None:
+        self._budget.check()
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        self._budget.charge(token_usage.get("total_tokens", 0))
+
+
+async def run_tool(name: str, func: Callable, *args: Any) -> Any:
+    """
+    Run a blocking tool call in a worker thread within the per-tool timeout.
+
+    The call sees its own child budget, which is cancelled when the timeout
+    hits so the thread stops at its next budget check. The thread is tracked
+    on the run budget, so the run can wait for abandoned workers to finish
+    before it rolls the repository back. Per-tool timeouts are raised as
+    ToolTimeoutError and reported to the agent; an exhausted run budget
+    raises BudgetExceededError and ends the run.
+    """
+    budget = current_budget.get()
+    if budget is None:
+        return await asyncio.to_thread(func, *args)
+
+    scope = budget.child(budget.tool_timeout)
+    done = threading.Event()
+    budget.track_worker(done)
+
+    def call():
+        current_budget.set(scope)
+        try:
+            return func(*args)
+        finally:
+            done.set()
+
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(call), scope.remaining())
+    except (asyncio.TimeoutError, BudgetExceededError):
+        # The worker may notice the per-tool deadline before wait_for does,
+        # only an exhausted run budget ends the run
+        try:
+            budget.check()
+        except BudgetExceededError as e:
+            scope.cancel(e.cause)
+            raise
+        cause = f"tool {name} timed out after {budget.tool_timeout}s"
+        scope.cancel(cause)
+        logger.warning(cause)
+        raise ToolTimeoutError(cause)
+    except asyncio.CancelledError:
+        scope.cancel(budget.cause or "run cancelled")
+        raise
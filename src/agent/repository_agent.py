@@ -6,14 +6,30 @@ from langchain.agents.format_scratchpad import format_to_openai_function_message
 from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, HumanMessagePromptTemplate
 from pathlib import Path
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Set
+import asyncio
+import json
 import logging
+import shutil
 from pydantic import BaseModel, Field
+from git import Repo
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
 
 from .tools.git_tools import InitRepoTool, GitCommitTool, GitPushTool
 from .tools.file_tools import CreateDirectoriesTool, WriteFileTool, LoadTemplateTool
 from .tools.template_tools import ParseTemplateTool
 from .tools.code_generation_tools import GenerateCodeTool, GenerateDocumentationTool
+from .tools.requirements_tools import AnalyzeRequirementsTool
+from .spec_index import SpecIndex, SpecMatch, current_match
+from .budget import (
+    BudgetCallbackHandler,
+    BudgetExceededError,
+    RunBudget,
+    RunResult,
+    ToolTimeoutError,
+    current_budget,
+    run_tool
+)
 from langchain.agents import AgentExecutor
 from langchain.schema import AgentAction, AgentFinish
 from langchain.tools.render import format_tool_to_openai_function
@@ -36,26 +52,68 @@ class RepositoryAgent(BaseModel):
     openai_api_key: str
     model_name: str = "gpt-4-turbo-preview"
     templates_dir: str = "templates"
+    index_dir: Optional[str] = ".spec_index"
+    reference_threshold: float = 0.6
+    # Time bounds in seconds, unbounded unless set
+    job_timeout: Optional[float] = None
+    tool_timeout: Optional[float] = None
+    llm_timeout: Optional[float] = None
+    max_iterations: int = 15
+    # How long a stopped run waits for tool threads still in flight before rolling back
+    shutdown_timeout: float = 30
+    token_budget: Optional[int] = None
     
     def model_post_init(self, __context) -> None:
+        # Index of previously generated projects, disabled when index_dir is None
+        spec_index = SpecIndex(self.index_dir) if self.index_dir else None
+        object.__setattr__(self, '_spec_index', spec_index)
+        
         # Initialize private attributes after model initialization
         object.__setattr__(self, '_llm', ChatOpenAI(
             temperature=0,
             model_name=self.model_name,
-            openai_api_key=self.openai_api_key
+            openai_api_key=self.openai_api_key,
+            request_timeout=self.llm_timeout
         ))
         
-        # Initialize tools
+        # Only used by create_repositories to analyze the requirements once up front,
+        # it is not one of the agent's tools
+        requirements_tool = AnalyzeRequirementsTool(
+            self.model_name,
+            self.openai_api_key,
+            request_timeout=self.llm_timeout,
+            handle_tool_error=True
+        )
+        object.__setattr__(self, '_requirements_tool', requirements_tool)
+        
+        # Initialize tools, tool timeouts are reported back to the agent as tool errors
         tools = [
-            InitRepoTool(),
-            GitCommitTool(),
-            GitPushTool(),
+            InitRepoTool(handle_tool_error=True),
+            GitCommitTool(handle_tool_error=True),
+            GitPushTool(handle_tool_error=True),
             CreateDirectoriesTool(),
             WriteFileTool(),
             LoadTemplateTool(templates_dir=self.templates_dir),
-            GenerateCodeTool(self.model_name, self.openai_api_key),
-            GenerateDocumentationTool(self.model_name, self.openai_api_key),
-            ParseTemplateTool(self.model_name, self.openai_api_key)
+            GenerateCodeTool(
+                self.model_name,
+                self.openai_api_key,
+                spec_index=spec_index,
+                reference_threshold=self.reference_threshold,
+                request_timeout=self.llm_timeout,
+                handle_tool_error=True
+            ),
+            GenerateDocumentationTool(
+                self.model_name,
+                self.openai_api_key,
+                request_timeout=self.llm_timeout,
+                handle_tool_error=True
+            ),
+            ParseTemplateTool(
+                self.model_name,
+                self.openai_api_key,
+                request_timeout=self.llm_timeout,
+                handle_tool_error=True
+            )
         ]
         object.__setattr__(self, '_tools', tools)
         
@@ -64,6 +122,13 @@ class RepositoryAgent(BaseModel):
             memory_key="chat_history",
             return_messages=True
         ))
+        object.__setattr__(self, '_agent_executor', self._build_agent_executor(self._memory))
+    
+    def _build_agent_executor(self, memory: ConversationBufferMemory) -> AgentExecutor:
+        """
+        Create an agent executor over the shared tools with its own conversation memory
+        """
+        tools = self._tools
         
         # Create tool descriptions
         tool_descriptions = "\n".join([f"- {tool.name}: {tool.description}" for tool in tools])
@@ -85,27 +150,117 @@ class RepositoryAgent(BaseModel):
         )
         
         # Create the agent executor with proper output keys
-        object.__setattr__(self, '_agent_executor', AgentExecutor(
+        return AgentExecutor(
             agent=agent,
             tools=tools,
-            memory=self._memory,
+            memory=memory,
             verbose=True,
             handle_parsing_errors=True,
+            max_iterations=self.max_iterations,
             return_intermediate_steps=False  # Changed to False to avoid memory issues
-        ))
+        )
     
     async def create_repository(self,
                               requirements: Dict,
                               language: str,
                               repo_path: Path,
-                              remote_url: Optional[str] = None) -> bool:
+                              remote_url: Optional[str] = None,
+                              domain_model: Optional[Dict] = None) -> RunResult:
+        """
+        Create a new repository with generated code based on requirements.
+        When a domain model from analyze_requirements is given, it is used instead of re-analyzing the requirements.
+        The returned RunResult is truthy on success and carries the cause of a failure or timeout.
+        """
+        budget = RunBudget(self.job_timeout, self.token_budget, self.tool_timeout)
+        return await self._create_repository(
+            self._agent_executor, budget, requirements, language, repo_path, remote_url, domain_model
+        )
+    
+    async def create_repositories(self,
+                                requirements: Dict,
+                                languages: List[str],
+                                base_path: Path,
+                                remote_urls: Optional[Dict[str, str]] = None) -> Dict[str, RunResult]:
         """
-        Create a new repository with generated code based on requirements
+        Create one repository per language from a single requirements analysis.
+        The requirements are analyzed once into a language-neutral domain model,
+        then each language is generated concurrently into base_path/<language>.
+        All targets share the job deadline and token budget.
         """
+        remote_urls = remote_urls or {}
+        job_budget = RunBudget(self.job_timeout, self.token_budget, self.tool_timeout)
+        
+        token = current_budget.set(job_budget)
+        try:
+            domain_model = await run_tool(self._requirements_tool.name, self._requirements_tool._run, requirements)
+        except ToolTimeoutError as e:
+            domain_model = {"error": str(e)}
+        except BudgetExceededError as e:
+            logger.error(f"Job stopped during requirements analysis: {e.cause}")
+            return {language: RunResult(success=False, timed_out=True, cause=e.cause) for language in languages}
+        finally:
+            current_budget.reset(token)
+        
+        if "error" in domain_model:
+            logger.warning(f"Shared requirements analysis failed, targets will analyze on their own: {domain_model['error']}")
+            domain_model = None
+        
+        # Each target gets its own executor so concurrent runs don't share conversation memory
+        results = await asyncio.gather(*[
+            self._create_repository(
+                self._build_agent_executor(ConversationBufferMemory(
+                    memory_key="chat_history",
+                    return_messages=True
+                )),
+                job_budget.child(),
+                requirements,
+                language,
+                Path(base_path) / language.lower(),
+                remote_urls.get(language),
+                domain_model
+            )
+            for language in languages
+        ], return_exceptions=True)
+        
+        outcomes = {}
+        for language, result in zip(languages, results):
+            # A cancelled target comes back as CancelledError, which is not an Exception
+            if isinstance(result, BaseException):
+                cause = str(result) or type(result).__name__
+                logger.error(f"Error creating {language} repository: {cause}")
+                result = RunResult(success=False, cause=cause)
+            outcomes[language] = result
+        return outcomes
+    
+    async def _create_repository(self,
+                               agent_executor: AgentExecutor,
+                               budget: RunBudget,
+                               requirements: Dict,
+                               language: str,
+                               repo_path: Path,
+                               remote_url: Optional[str],
+                               domain_model: Optional[Dict]) -> RunResult:
+        # Record what was there before the run so a rollback only undoes this run's changes
+        # Filesystem and git work runs in a thread so concurrent targets aren't blocked
+        snapshot = await asyncio.to_thread(self._snapshot_repository, Path(repo_path))
+        
+        # Look up prior projects on the original requirements, generate_code picks the match up
+        match = await asyncio.to_thread(self._find_match, requirements, language)
+        match_token = current_match.set(match)
+        
+        token = current_budget.set(budget)
         try:
+            if domain_model:
+                specification = f"""requirements already analyzed into this language-neutral domain model:
+            {json.dumps(domain_model, indent=2)}
+            
+            Use this domain model as the requirements. Do not analyze the requirements again."""
+            else:
+                specification = f"""these requirements:
+            {requirements}"""
+            
             instruction = f"""
-            Create a new {language} project repository at {repo_path} with these requirements:
-            {requirements}
+            Create a new {language} project repository at {repo_path} with {specification}
             
             Follow these steps:
             1. Initialize a Git repository at {repo_path}
@@ -125,18 +280,157 @@ class RepositoryAgent(BaseModel):
             Handle any errors gracefully and maintain a clean repository state.
             """
             
-            # Use ainvoke instead of arun
-            result = await self._agent_executor.ainvoke({"input": instruction})
+            # Use ainvoke instead of arun, cancelling in-flight calls once the deadline passes
+            try:
+                result = await asyncio.wait_for(
+                    agent_executor.ainvoke(
+                        {"input": instruction},
+                        config={"callbacks": [BudgetCallbackHandler(budget)]}
+                    ),
+                    budget.remaining()
+                )
+            except asyncio.TimeoutError:
+                budget.cancel("deadline exceeded")
+                raise BudgetExceededError(budget.cause)
             
             # Log the result for debugging
             logger.info(f"Agent execution result: {result}")
             
             # Extract the output from the result dictionary
             output = result.get("output", "")
-            if isinstance(output, str):
-                return "error" not in output.lower() and "stopped due to" not in output.lower()
-            return False
+            if not isinstance(output, str):
+                return RunResult(success=False, cause="agent returned no output")
+            if "stopped due to" in output.lower():
+                raise BudgetExceededError(f"iteration limit of {self.max_iterations} reached")
+            if "error" in output.lower():
+                return RunResult(success=False, cause="agent reported an error")
+            
+            # A project served from the cache is already in the index
+            if match is None or not match.reused:
+                await asyncio.to_thread(self._record_project, requirements, language, repo_path)
+            return RunResult(success=True)
             
+        except BudgetExceededError as e:
+            # Stop tool work still running in worker threads and let it finish before touching the repository
+            budget.cancel(e.cause)
+            logger.error(f"Run for {repo_path} stopped: {e.cause}")
+            if not await asyncio.to_thread(budget.wait_for_workers, self.shutdown_timeout):
+                logger.warning(f"Tool threads still running after {self.shutdown_timeout}s, rolling back anyway")
+            await asyncio.to_thread(self._rollback_repository, Path(repo_path), snapshot)
+            return RunResult(success=False, timed_out=True, cause=e.cause)
         except Exception as e:
             logger.error(f"Error in create_repository: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+        finally:
+            current_budget.reset(token)
+            current_match.reset(match_token)
+    
+    def _load_template(self, language: str) -> str:
+        template_file = Path(self.templates_dir) / f"template_{language.lower()}.txt"
+        try:
+            return template_file.read_text(encoding='utf-8')
+        except OSError:
+            return ""
+    
+    def _find_match(self, requirements: Dict, language: str) -> Optional[SpecMatch]:
+        """
+        Find the prior project to reuse or reference, an exact match takes precedence over the closest one
+        """
+        if self._spec_index is None:
+            return None
+        exact_id = self._spec_index.find_exact(requirements, language, self._load_template(language))
+        if exact_id is not None:
+            return SpecMatch(exact_id, 1.0, exact=True)
+        closest = self._spec_index.query(requirements, language)
+        return SpecMatch(*closest) if closest is not None else None
+    
+    @staticmethod
+    def _list_files(repo_path: Path) -> Set[str]:
+        return {
+            path.relative_to(repo_path).as_posix()
+            for path in repo_path.rglob("*")
+            if path.is_file() and ".git" not in path.relative_to(repo_path).parts
+        }
+    
+    @staticmethod
+    def _changed_paths(repo: Repo) -> Set[str]:
+        """
+        Tracked paths with staged or unstaged changes
+        """
+        changed = repo.git.diff("--name-only", "-z").split("\0")
+        changed += repo.git.diff("--name-only", "--cached", "-z").split("\0")
+        return {path for path in changed if path}
+    
+    def _snapshot_repository(self, repo_path: Path) -> Optional[Dict]:
+        """
+        Record the files and uncommitted changes of an existing directory, None if the run creates it
+        """
+        if not repo_path.exists():
+            return None
+        try:
+            dirty = self._changed_paths(Repo(repo_path))
+        except (InvalidGitRepositoryError, GitCommandError):
+            dirty = set()
+        return {"files": self._list_files(repo_path), "dirty": dirty}
+    
+    def _rollback_repository(self, repo_path: Path, snapshot: Optional[Dict]) -> None:
+        """
+        Discard the uncommitted changes of an interrupted run so it leaves the last committed state.
+        A directory this run created is reset to its last commit, or removed when nothing was committed;
+        in a pre-existing one only the paths this run changed are restored, leaving the user's own
+        uncommitted work untouched.
+        """
+        try:
+            repo = Repo(repo_path)
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            repo = None
+        try:
+            if snapshot is None:
+                if repo is None or not repo.head.is_valid():
+                    # Nothing was committed yet, so the run leaves nothing behind
+                    if repo_path.exists():
+                        shutil.rmtree(repo_path)
+                    logger.info(f"Removed {repo_path} created by this run")
+                    return
+                repo.git.reset("--hard")
+                repo.git.clean("-fd")
+                logger.info(f"Rolled back uncommitted changes in {repo_path}")
+                return
+            
+            tracked = set()
+            if repo is not None:
+                # Unstage and restore tracked files this run modified, paths dirty before the run are kept
+                changed = sorted(self._changed_paths(repo) - snapshot["dirty"])
+                if changed:
+                    repo.git.reset("-q", "--", *changed)
+                tracked = {path for path in repo.git.ls_files("-z").split("\0") if path}
+                restore = [path for path in changed if path in tracked]
+                if restore:
+                    repo.git.checkout("--", *restore)
+            
+            # Remove files this run added without committing them
+            for path in sorted(self._list_files(repo_path) - snapshot["files"] - tracked):
+                (repo_path / path).unlink()
+            logger.info(f"Rolled back the changes of this run in {repo_path}")
+        except (GitCommandError, OSError) as e:
+            logger.error(f"Failed to roll back {repo_path}: {str(e)}")
+    
+    def _record_project(self, requirements: Dict, language: str, repo_path: Path) -> None:
+        """
+        Store the generated files in the spec index so later runs can reuse or reference them
+        """
+        if self._spec_index is None:
+            return
+        try:
+            repo_path = Path(repo_path)
+            files = {}
+            for path in repo_path.rglob("*"):
+                if path.is_file() and ".git" not in path.relative_to(repo_path).parts:
+                    try:
+                        files[path.relative_to(repo_path).as_posix()] = path.read_text(encoding='utf-8')
+                    except UnicodeDecodeError:
+                        continue
+            if files:
+                self._spec_index.add(requirements, language, files, self._load_template(language))
+        except Exception as e:
+            logger.error(f"Failed to record project in spec index: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,273 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+import random
+import re
+import uuid
+
+try:
+    import fcntl
+
+    def _lock(handle) -> None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(handle) -> None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock(handle) -> None:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(handle) -> None:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used for the universal hash family of the MinHash permutations
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_requirements(requirements: Union[str, Dict]) -> str:
+    """Reduce requirements to a canonical lowercase word sequence"""
+    if not isinstance(requirements, str):
+        requirements = json.dumps(requirements, sort_keys=True, default=str)
+    text = requirements.lower()
+    text = re.sub(r"[^a-z0-9_/{}]+", " ", text)
+    return " ".join(text.split())
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Build the set of word n-gram shingles of a normalized text"""
+    words = text.split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def fingerprint(requirements: Union[str, Dict], language: str, template: str = "") -> str:
+    """Exact key of a spec: its normalized requirements, language and template digest"""
+    template_digest = hashlib.sha256(template.encode('utf-8')).hexdigest()
+    key = "\0".join([normalize_requirements(requirements), language.lower(), template_digest])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class SpecMatch:
+    """Closest prior project of a run, shared with the tools through `current_match`"""
+
+    def __init__(self, entry_id: str, score: float, exact: bool = False):
+        self.entry_id = entry_id
+        self.score = score
+        # Only an exact match of requirements, language and template may reuse the cached files
+        self.exact = exact
+        # Set when the cached files were served as the generated project
+        self.reused = False
+
+
+current_match: ContextVar[Optional[SpecMatch]] = ContextVar("current_match", default=None)
+
+
+class SpecIndex:
+    """
+    Local similarity index over previously generated projects.
+
+    Requirements are normalized, shingled and reduced to a MinHash signature.
+    Signatures are bucketed with LSH banding so lookups only compare against
+    likely candidates, which keeps queries fast with tens of thousands of entries.
+    Generated files are stored per entry: a spec with the same fingerprint can
+    reuse them as is, near-duplicates only get them as a reference.
+
+    Entries are appended to a JSONL log under a file lock, so several workers
+    can share one index directory and each sees the others' entries.
+    """
+
+    def __init__(self,
+                 index_dir: Union[str, Path] = ".spec_index",
+                 num_perm: int = 128,
+                 bands: int = 32,
+                 shingle_size: int = 5,
+                 seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.index_dir = Path(index_dir)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+        self._entries: Dict[str, Dict] = {}
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[str]] = {}
+        self._by_fingerprint: Dict[str, str] = {}
+        self._offset = 0
+        self._refresh()
+
+    @property
+    def _index_file(self) -> Path:
+        return self.index_dir / "index.jsonl"
+
+    @property
+    def _lock_file(self) -> Path:
+        return self.index_dir / "index.lock"
+
+    def _project_file(self, entry_id: str) -> Path:
+        return self.index_dir / "projects" / f"{entry_id}.json"
+
+    @contextmanager
+    def _locked(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_file, 'a+b') as handle:
+            _lock(handle)
+            try:
+                yield
+            finally:
+                _unlock(handle)
+
+    def _refresh(self) -> None:
+        """Load the entries appended to the log since the last refresh"""
+        try:
+            with open(self._index_file, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Failed to load spec index: {str(e)}")
+            return
+
+        # A line without its newline is still being written by another worker
+        end = data.rfind(b"\n")
+        if end < 0:
+            return
+        self._offset += end + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping corrupt spec index entry")
+                continue
+            if len(entry.get("signature", [])) != self.num_perm:
+                logger.warning(f"Skipping spec index entry {entry.get('id')} built with different parameters")
+                continue
+            self._add_entry(entry)
+
+    def _add_entry(self, entry: Dict) -> None:
+        if entry["id"] in self._entries:
+            return
+        self._entries[entry["id"]] = entry
+        # Entries written before fingerprints were stored can still serve as references
+        if entry.get("fingerprint"):
+            self._by_fingerprint.setdefault(entry["fingerprint"], entry["id"])
+        for key in self._band_keys(entry["language"], entry["signature"]):
+            self._buckets.setdefault(key, []).append(entry["id"])
+
+    def _band_keys(self, language: str, signature: List[int]):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield (language, band, tuple(signature[start:start + self.rows]))
+
+    def signature(self, requirements: Union[str, Dict]) -> List[int]:
+        """Compute the MinHash signature of the given requirements"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'big')
+            for s in shingles(normalize_requirements(requirements), self.shingle_size)
+        ]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimate the Jaccard similarity of two signatures"""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def add(self,
+            requirements: Union[str, Dict],
+            language: str,
+            files: Dict[str, str],
+            template: str = "") -> str:
+        """
+        Record a generated project and return its entry id.
+        A project whose fingerprint is already indexed is not stored again.
+        """
+        entry = {
+            "id": uuid.uuid4().hex,
+            "language": language.lower(),
+            "fingerprint": fingerprint(requirements, language, template),
+            "signature": self.signature(requirements),
+        }
+        with self._locked():
+            self._refresh()
+            existing = self._by_fingerprint.get(entry["fingerprint"])
+            if existing is not None:
+                return existing
+
+            # Write the files first so a logged entry always has its project
+            project_file = self._project_file(entry["id"])
+            project_file.parent.mkdir(parents=True, exist_ok=True)
+            project_file.write_text(json.dumps(files), encoding='utf-8')
+            with open(self._index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+            self._refresh()
+        return entry["id"]
+
+    def find_exact(self, requirements: Union[str, Dict], language: str, template: str = "") -> Optional[str]:
+        """Return the id of a prior project generated from the same requirements, language and template"""
+        self._refresh()
+        return self._by_fingerprint.get(fingerprint(requirements, language, template))
+
+    def query(self, requirements: Union[str, Dict], language: str) -> Optional[Tuple[str, float]]:
+        """Return the id and estimated similarity of the closest prior project"""
+        self._refresh()
+        language = language.lower()
+        signature = self.signature(requirements)
+        candidates = set()
+        for key in self._band_keys(language, signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best = None
+        for entry_id in candidates:
+            score = self.similarity(signature, self._entries[entry_id]["signature"])
+            if best is None or score > best[1]:
+                best = (entry_id, score)
+        return best
+
+    def load_files(self, entry_id: str) -> Dict[str, str]:
+        """Load the generated files stored for an entry"""
+        try:
+            return json.loads(self._project_file(entry_id).read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to load cached project {entry_id}: {str(e)}")
+            return {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def format_reference(files: Dict[str, str], max_chars: int = 8000) -> str:
+    """Render a prior project as a compact few-shot reference within a character budget"""
+    parts = ["Files:\n" + "\n".join(f"- {path}" for path in sorted(files))]
+    budget = max_chars - len(parts[0])
+    for path in sorted(files):
+        snippet = f"\n--- {path} ---\n{files[path]}"
+        if len(snippet) > budget:
+            continue
+        parts.append(snippet)
+        budget -= len(snippet)
+    return "\n".join(parts)
@@ -2,6 +2,7 @@ from .git_tools import InitRepoTool, GitCommitTool, GitPushTool
 from .file_tools import CreateDirectoriesTool, WriteFileTool, LoadTemplateTool
 from .template_tools import ParseTemplateTool
 from .code_generation_tools import GenerateCodeTool, GenerateDocumentationTool
+from .requirements_tools import AnalyzeRequirementsTool
 
 __all__ = [
     'InitRepoTool',
@@ -12,5 +13,6 @@ __all__ = [
     'LoadTemplateTool',
     'ParseTemplateTool',
     'GenerateCodeTool',
-    'GenerateDocumentationTool'
+    'GenerateDocumentationTool',
+    'AnalyzeRequirementsTool'
 ] 
\ No newline at end of file
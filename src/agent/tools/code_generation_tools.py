@@ -1,31 +1,184 @@
 from langchain.tools import BaseTool
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from typing import Dict
+from typing import Any, Dict, List, Optional
 import logging
 import json
 from pydantic import Field, PrivateAttr
 import os
 
+from ..budget import BudgetExceededError, check_budget, run_tool
+from ..spec_index import SpecIndex, current_match, format_reference
+from .structured_output import (
+    bind_schema,
+    invoke_with_repair,
+    is_partial,
+    merge_sections,
+    missing_sections,
+    sections_retry_instruction
+)
+
 logger = logging.getLogger(__name__)
 
+CODE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "manifest": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Every file path of the project, listed before any file content"
+        },
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "content": {"type": "string"}
+                },
+                "required": ["path", "content"]
+            }
+        }
+    },
+    "required": ["manifest", "files"]
+}
+
+DOCUMENTATION_SECTIONS = ["readme", "architecture"]
+
+DOCUMENTATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "readme": {"type": "string", "description": "Content of README.md"},
+        "architecture": {"type": "string", "description": "Content of docs/architecture.md"}
+    },
+    "required": DOCUMENTATION_SECTIONS
+}
+
+# Directories that never contain project sources worth documenting
+_IGNORED_DIRS = {'.git', '__pycache__', 'bin', 'obj', 'node_modules', '.venv', 'venv'}
+
+_DOCUMENTATION_FILES = {'README.md', os.path.join('docs', 'architecture.md')}
+
+_LANGUAGES_BY_EXTENSION = {
+    '.py': 'Python',
+    '.cs': 'C#',
+    '.java': 'Java',
+    '.ts': 'TypeScript',
+    '.js': 'JavaScript',
+    '.go': 'Go',
+    '.rs': 'Rust'
+}
+
+
+def _detect_language(files: Dict[str, str]) -> str:
+    """Name the dominant programming language of the collected files"""
+    counts: Dict[str, int] = {}
+    for path in files:
+        language = _LANGUAGES_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+        if language:
+            counts[language] = counts.get(language, 0) + 1
+    return max(counts, key=counts.get) if counts else "software"
+
+# Placeholder used when nothing usable was salvaged and the whole project has to be requested again
+_WHOLE_PROJECT = "*"
+
+# Placeholder used when the manifest was cut off and the files it didn't list are still unknown
+_REST_OF_MANIFEST = "<manifest>"
+
+
+def _merge_files(data: Dict, collected: Dict) -> None:
+    manifest = collected.setdefault("manifest", [])
+    if "manifest" in data:
+        # A later complete manifest settles one that was cut off
+        collected["manifest_partial"] = is_partial(data["manifest"])
+    for path in data.get("manifest") or []:
+        if isinstance(path, str) and path not in manifest:
+            manifest.append(path)
+    files = collected.setdefault("files", {})
+    for item in data.get("files") or []:
+        if isinstance(item, dict) and isinstance(item.get("path"), str) and isinstance(item.get("content"), str):
+            files.setdefault(item["path"], item["content"])
+
+
+def _missing_files(collected: Dict) -> List[str]:
+    files = collected.get("files", {})
+    manifest = collected.get("manifest", [])
+    if not files and not manifest:
+        return [_WHOLE_PROJECT]
+    outstanding = [path for path in manifest if path not in files]
+    if collected.get("manifest_partial"):
+        outstanding.insert(0, _REST_OF_MANIFEST)
+    return outstanding
+
+
+def _files_retry_instruction(collected: Dict, outstanding: List[str]) -> str:
+    if outstanding == [_WHOLE_PROJECT]:
+        return "Your previous response could not be used. Call write_project_files again with the complete project."
+    if _REST_OF_MANIFEST in outstanding:
+        return (
+            "Your previous response was cut off in the manifest. These files were already received: "
+            f"{', '.join(sorted(collected.get('files', {})))}. "
+            "Call write_project_files again with the complete manifest of the project "
+            "and return only the files that were not received yet."
+        )
+    return (
+        "Your previous response was cut off. These files were already received: "
+        f"{', '.join(sorted(collected.get('files', {})))}. "
+        "Call write_project_files again and return only these missing files, "
+        f"with the manifest listing just them: {', '.join(outstanding)}."
+    )
+
 class GenerateCodeTool(BaseTool):
     name: str = "generate_code"
-    description: str = "Generate source code based on requirements and template"
+    description: str = "Generate source code based on requirements and template. Files that could not be generated are listed under 'missing_files'"
     
-    def __init__(self, model_name: str, openai_api_key: str, **data):
+    def __init__(self,
+                 model_name: str,
+                 openai_api_key: str,
+                 spec_index: Optional[SpecIndex] = None,
+                 reference_threshold: float = 0.6,
+                 max_repair_requests: int = 2,
+                 request_timeout: Optional[float] = None,
+                 **data):
         super().__init__(**data)
         # Initialize private attributes before using them
         object.__setattr__(self, '_model_name', model_name)
         object.__setattr__(self, '_openai_api_key', openai_api_key)
+        object.__setattr__(self, '_spec_index', spec_index)
+        object.__setattr__(self, '_reference_threshold', reference_threshold)
+        object.__setattr__(self, '_max_repair_requests', max_repair_requests)
+        object.__setattr__(self, '_request_timeout', request_timeout)
         object.__setattr__(self, '_llm', ChatOpenAI(
             model_name=model_name,
             openai_api_key=openai_api_key,
-            temperature=0.2
+            temperature=0.2,
+            request_timeout=request_timeout
+        ))
+        object.__setattr__(self, '_structured_llm', bind_schema(
+            self._llm,
+            "write_project_files",
+            "Return the generated project files",
+            CODE_SCHEMA
         ))
     
-    def _run(self, requirements: Dict, template: str, language: str) -> Dict[str, str]:
+    def _run(self, requirements: Dict, template: str, language: str) -> Dict[str, Any]:
         try:
+            # The match is looked up by the run on the original requirements, not on this
+            # tool's arguments, which are the model's own rewording of the spec
+            reference = "None"
+            match = current_match.get()
+            if self._spec_index is not None and match is not None:
+                # A similarity estimate can't tell one technology from another, only exact matches are reused
+                if match.exact:
+                    cached = self._spec_index.load_files(match.entry_id)
+                    if cached:
+                        logger.info(f"Reusing cached project {match.entry_id}")
+                        match.reused = True
+                        return cached
+                if match.score >= self._reference_threshold:
+                    logger.info(f"Using prior project {match.entry_id} as reference (similarity {match.score:.2f})")
+                    reference = format_reference(self._spec_index.load_files(match.entry_id))
+
             prompt = ChatPromptTemplate.from_messages([
                 ("system", """You are an expert software developer specializing in creating well-structured applications.
                 You follow clean architecture principles and best practices."""),
@@ -43,64 +196,103 @@ class GenerateCodeTool(BaseTool):
                 4. Include proper error handling and logging
                 5. Add appropriate comments and docstrings
                 
-                Return a JSON object where keys are file paths and values are the file contents.
+                A previously generated project with similar requirements, if any.
+                Reuse its files unchanged where the requirements match and only adapt what differs:
+                {reference}
+                
+                Return the project by calling write_project_files. List every file path in the
+                manifest first, then provide the content of each file.
                 The file paths should follow the structure described in the template.
                 """)
             ])
             
-            response = self._llm.predict_messages(
+            collected, outstanding = invoke_with_repair(
+                self._structured_llm,
                 prompt.format_messages(
                     language=language,
                     requirements=requirements,
-                    template=template
-                )
+                    template=template,
+                    reference=reference
+                ),
+                merge=_merge_files,
+                missing=_missing_files,
+                retry_instruction=_files_retry_instruction,
+                max_repair_requests=self._max_repair_requests,
+                request_timeout=self._request_timeout
             )
             
-            try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
-                logger.error("Failed to parse LLM response as JSON")
+            files = collected.get("files", {})
+            if not files:
+                logger.error("Failed to salvage any files from the LLM response")
                 return {"error": "Failed to generate valid code structure"}
+            if outstanding:
+                logger.warning(f"Files still missing after repair requests: {', '.join(outstanding)}")
+                return {**files, "missing_files": outstanding}
+            return files
             
+        except BudgetExceededError:
+            raise
         except Exception as e:
             logger.error(f"Error generating code: {str(e)}")
             return {"error": f"Failed to generate code: {str(e)}"}
     
-    def _arun(self, requirements: Dict, template: str, language: str) -> Dict[str, str]:
-        return self._run(requirements, template, language)
+    async def _arun(self, requirements: Dict, template: str, language: str) -> Dict[str, Any]:
+        # Run the blocking LLM calls in a worker thread, bounded by the per-tool timeout
+        return await run_tool(self.name, self._run, requirements, template, language)
 
 class GenerateDocumentationTool(BaseTool):
     name: str = "generate_documentation"
     description: str = "Generate project documentation including README and architecture docs. Args format: 'repo_path'"
     
-    def __init__(self, model_name: str, openai_api_key: str, **data):
+    def __init__(self,
+                 model_name: str,
+                 openai_api_key: str,
+                 max_repair_requests: int = 2,
+                 request_timeout: Optional[float] = None,
+                 **data):
         super().__init__(**data)
         object.__setattr__(self, '_model_name', model_name)
         object.__setattr__(self, '_openai_api_key', openai_api_key)
+        object.__setattr__(self, '_max_repair_requests', max_repair_requests)
+        object.__setattr__(self, '_request_timeout', request_timeout)
         object.__setattr__(self, '_llm', ChatOpenAI(
             model_name=model_name,
             openai_api_key=openai_api_key,
-            temperature=0.3
+            temperature=0.3,
+            request_timeout=request_timeout
+        ))
+        object.__setattr__(self, '_structured_llm', bind_schema(
+            self._llm,
+            "write_documentation",
+            "Return the project documentation",
+            DOCUMENTATION_SCHEMA
         ))
     
     def _run(self, repo_path: str) -> str:
         try:
-            # Collect information about the generated files
+            # Collect information about the generated files of any language
             generated_files = {}
-            for root, _, files in os.walk(repo_path):
+            for root, dirs, files in os.walk(repo_path):
+                dirs[:] = [d for d in dirs if d not in _IGNORED_DIRS]
                 for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
+                    file_path = os.path.join(root, file)
+                    relative_path = os.path.relpath(file_path, repo_path)
+                    # Skip the documentation this tool is about to (re)write
+                    if relative_path in _DOCUMENTATION_FILES:
+                        continue
+                    try:
                         with open(file_path, 'r', encoding='utf-8') as f:
-                            generated_files[os.path.relpath(file_path, repo_path)] = f.read()
+                            generated_files[relative_path] = f.read()
+                    except UnicodeDecodeError:
+                        continue
 
             prompt = ChatPromptTemplate.from_messages([
                 ("system", "You are an expert technical writer."),
                 ("user", """
-                Generate documentation for a Python project with these files:
+                Generate documentation for a {language} project with these files:
                 {files}
                 
-                Return a JSON object with 'readme' and 'architecture' documentation.
+                Return the documentation by calling write_documentation with 'readme' and 'architecture'.
                 The README should include:
                 1. Project overview
                 2. Installation instructions
@@ -115,33 +307,45 @@ class GenerateDocumentationTool(BaseTool):
                 """)
             ])
             
-            response = self._llm.invoke(
-                prompt.format_messages(files=json.dumps(generated_files, indent=2))
+            docs, outstanding = invoke_with_repair(
+                self._structured_llm,
+                prompt.format_messages(
+                    language=_detect_language(generated_files),
+                    files=json.dumps(generated_files, indent=2)
+                ),
+                merge=merge_sections(DOCUMENTATION_SECTIONS),
+                missing=missing_sections(DOCUMENTATION_SECTIONS),
+                retry_instruction=sections_retry_instruction,
+                max_repair_requests=self._max_repair_requests,
+                request_timeout=self._request_timeout
             )
             
-            try:
-                docs = json.loads(response.content)
-                
-                # Write the documentation files
-                readme_path = os.path.join(repo_path, 'README.md')
+            if not docs:
+                logger.error("Failed to salvage any documentation from the LLM response")
+                return f"Failed to generate documentation: Invalid response format"
+            
+            # Don't write into a repository that is being rolled back
+            check_budget()
+            
+            # Write the documentation files that were generated
+            if 'readme' in docs:
+                with open(os.path.join(repo_path, 'README.md'), 'w', encoding='utf-8') as f:
+                    f.write(str(docs['readme']))
+            if 'architecture' in docs:
                 arch_path = os.path.join(repo_path, 'docs')
                 os.makedirs(arch_path, exist_ok=True)
-                arch_path = os.path.join(arch_path, 'architecture.md')
-                
-                with open(readme_path, 'w', encoding='utf-8') as f:
-                    f.write(docs['readme'])
-                with open(arch_path, 'w', encoding='utf-8') as f:
-                    f.write(docs['architecture'])
-                
-                return f"Successfully generated documentation in {repo_path}"
-                
-            except json.JSONDecodeError:
-                logger.error("Failed to parse LLM response as JSON")
-                return f"Failed to generate documentation: Invalid response format"
+                with open(os.path.join(arch_path, 'architecture.md'), 'w', encoding='utf-8') as f:
+                    f.write(str(docs['architecture']))
+            
+            if outstanding:
+                return f"Partially generated documentation in {repo_path}, missing: {', '.join(outstanding)}"
+            return f"Successfully generated documentation in {repo_path}"
             
+        except BudgetExceededError:
+            raise
         except Exception as e:
             logger.error(f"Error generating documentation: {str(e)}")
             return f"Failed to generate documentation: {str(e)}"
     
     async def _arun(self, repo_path: str) -> str:
-        return self._run(repo_path) 
\ No newline at end of file
+        return await run_tool(self.name, self._run, repo_path) 
\ No newline at end of file
@@ -4,8 +4,15 @@ from pathlib import Path
 from typing import Optional
 import logging
 
+from ..budget import BudgetExceededError, check_budget, current_budget, run_tool
+
 logger = logging.getLogger(__name__)
 
+def _git_timeout() -> Optional[float]:
+    """Seconds a git subprocess may run before it is killed, None when unbounded"""
+    budget = current_budget.get()
+    return budget.timeout_for() if budget is not None else None
+
 class InitRepoTool(BaseTool):
     name: str = "init_repository"
     description: str = "Initialize a new Git repository at the specified path"
@@ -14,12 +21,13 @@ class InitRepoTool(BaseTool):
         try:
             repo = Repo.init(Path(path))
             return f"Successfully initialized repository at {path}"
+        except BudgetExceededError:
+            raise
         except Exception as e:
             return f"Failed to initialize repository: {str(e)}"
     
     async def _arun(self, path: str) -> str:
-        # For synchronous operations, we can just return the _run result
-        return self._run(path)
+        return await run_tool(self.name, self._run, path)
 
 class GitCommitTool(BaseTool):
     name: str = "git_commit"
@@ -32,14 +40,17 @@ class GitCommitTool(BaseTool):
         try:
             repo_path, message = args.split("::")
             repo = Repo(repo_path)
-            repo.git.add(A=True)
+            check_budget()
+            repo.git.add(A=True, kill_after_timeout=_git_timeout())
             repo.index.commit(message)
             return f"Successfully committed changes with message: {message}"
+        except BudgetExceededError:
+            raise
         except Exception as e:
             return f"Failed to commit changes: {str(e)}"
     
     async def _arun(self, args: str) -> str:
-        return self._run(args)
+        return await run_tool(self.name, self._run, args)
 
 class GitPushTool(BaseTool):
     name: str = "git_push"
@@ -54,10 +65,14 @@ class GitPushTool(BaseTool):
             repo = Repo(repo_path)
             if remote_url and "origin" not in repo.remotes:
                 repo.create_remote("origin", remote_url)
-            repo.remotes.origin.push()
+            check_budget()
+            # Killed once the per-tool timeout or the run deadline is reached
+            repo.remotes.origin.push(kill_after_timeout=_git_timeout())
             return "Successfully pushed changes to remote"
+        except BudgetExceededError:
+            raise
         except Exception as e:
             return f"Failed to push changes: {str(e)}"
     
     async def _arun(self, args: str) -> str:
-        return self._run(args) 
\ No newline at end of file
+        return await run_tool(self.name, self._run, args) 
\ No newline at end of file
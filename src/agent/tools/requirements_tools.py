@@ -0,0 +1,151 @@
+from langchain.tools import BaseTool
+from langchain_openai import ChatOpenAI
+from langchain.prompts import ChatPromptTemplate
+from typing import Dict, Optional, Union
+import logging
+
+from ..budget import BudgetExceededError, run_tool
+from .structured_output import (
+    bind_schema,
+    invoke_with_repair,
+    merge_sections,
+    missing_sections,
+    sections_retry_instruction
+)
+
+logger = logging.getLogger(__name__)
+
+DOMAIN_MODEL_SECTIONS = ["name", "description", "entities", "endpoints", "ports", "non_functional"]
+
+DOMAIN_MODEL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "entities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "description": {"type": "string"},
+                    "attributes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "type": {"type": "string", "description": "Language-neutral type such as string, integer, uuid or datetime"},
+                                "required": {"type": "boolean"}
+                            },
+                            "required": ["name", "type"]
+                        }
+                    },
+                    "rules": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["name", "attributes"]
+            }
+        },
+        "endpoints": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "method": {"type": "string"},
+                    "path": {"type": "string"},
+                    "description": {"type": "string"},
+                    "request": {"type": "string"},
+                    "response": {"type": "string"}
+                },
+                "required": ["method", "path", "description"]
+            }
+        },
+        "ports": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "kind": {"type": "string", "enum": ["inbound", "outbound"]},
+                    "description": {"type": "string"}
+                },
+                "required": ["name", "kind", "description"]
+            }
+        },
+        "non_functional": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": DOMAIN_MODEL_SECTIONS
+}
+
+class AnalyzeRequirementsTool(BaseTool):
+    name: str = "analyze_requirements"
+    description: str = "Analyze requirements into a language-neutral domain model of entities, endpoints and ports"
+
+    def __init__(self,
+                 model_name: str,
+                 openai_api_key: str,
+                 max_repair_requests: int = 2,
+                 request_timeout: Optional[float] = None,
+                 **data):
+        super().__init__(**data)
+        object.__setattr__(self, '_model_name', model_name)
+        object.__setattr__(self, '_openai_api_key', openai_api_key)
+        object.__setattr__(self, '_max_repair_requests', max_repair_requests)
+        object.__setattr__(self, '_request_timeout', request_timeout)
+        object.__setattr__(self, '_llm', ChatOpenAI(
+            model_name=model_name,
+            openai_api_key=openai_api_key,
+            temperature=0.1,
+            request_timeout=request_timeout
+        ))
+        object.__setattr__(self, '_structured_llm', bind_schema(
+            self._llm,
+            "describe_domain_model",
+            "Return the language-neutral domain model of the requirements",
+            DOMAIN_MODEL_SCHEMA
+        ))
+
+    def _run(self, requirements: Union[str, Dict]) -> Dict:
+        try:
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", "You are an expert software architect practicing domain-driven design and hexagonal architecture."),
+                ("user", """
+                Analyze these requirements into a language-neutral domain model:
+                {requirements}
+
+                Extract:
+                1. The domain entities with their attributes, language-neutral types and rules
+                2. The API endpoints with method, path, request and response
+                3. The inbound and outbound ports of the hexagonal architecture
+                4. The non-functional requirements
+
+                Do not use any programming language specific types or names.
+                Return the model by calling describe_domain_model.
+                """)
+            ])
+
+            domain_model, outstanding = invoke_with_repair(
+                self._structured_llm,
+                prompt.format_messages(requirements=requirements),
+                merge=merge_sections(DOMAIN_MODEL_SECTIONS),
+                missing=missing_sections(DOMAIN_MODEL_SECTIONS),
+                retry_instruction=sections_retry_instruction,
+                max_repair_requests=self._max_repair_requests,
+                request_timeout=self._request_timeout
+            )
+
+            if not domain_model:
+                logger.error("Failed to salvage any domain model from the LLM response")
+                return {"error": "Failed to analyze requirements"}
+            if outstanding:
+                domain_model["missing_sections"] = outstanding
+            return domain_model
+
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            logger.error(f"Error analyzing requirements: {str(e)}")
+            return {"error": f"Failed to analyze requirements: {str(e)}"}
+
+    async def _arun(self, requirements: Union[str, Dict]) -> Dict:
+        return await run_tool(self.name, self._run, requirements)
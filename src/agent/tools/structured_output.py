@@ -0,0 +1,208 @@
+from langchain.schema import HumanMessage
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import logging
+
+from ..budget import budget_callbacks, check_budget, current_budget
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+
+class _Truncated(Exception):
+    """Raised when a JSON value ends before it is complete"""
+
+
+class PartialDict(dict):
+    """Object salvaged from incomplete JSON, only its complete members are present"""
+
+
+class PartialList(list):
+    """Array salvaged from incomplete JSON, only its complete elements are present"""
+
+
+def is_partial(value: Any) -> bool:
+    return isinstance(value, (PartialDict, PartialList))
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in _WHITESPACE:
+        index += 1
+    return index
+
+
+def _parse_value(text: str, index: int) -> Tuple[Any, int, bool]:
+    index = _skip_whitespace(text, index)
+    if index >= len(text):
+        raise _Truncated()
+    if text[index] == '{':
+        return _parse_object(text, index + 1)
+    if text[index] == '[':
+        return _parse_array(text, index + 1)
+    try:
+        value, end = _DECODER.raw_decode(text, index)
+    except json.JSONDecodeError:
+        raise _Truncated()
+    # Only strings are self-delimiting, any other scalar running into the end may be cut short
+    if end >= len(text) and not isinstance(value, str):
+        raise _Truncated()
+    return value, end, True
+
+
+def _parse_object(text: str, index: int) -> Tuple[Dict, int, bool]:
+    result = PartialDict()
+    while True:
+        index = _skip_whitespace(text, index)
+        if index >= len(text):
+            return result, index, False
+        if text[index] == '}':
+            return dict(result), index + 1, True
+        if text[index] == ',':
+            index += 1
+            continue
+        try:
+            key, index = _DECODER.raw_decode(text, index)
+        except json.JSONDecodeError:
+            return result, index, False
+        index = _skip_whitespace(text, index)
+        if index >= len(text) or text[index] != ':' or not isinstance(key, str):
+            return result, index, False
+        try:
+            value, index, complete = _parse_value(text, index + 1)
+        except _Truncated:
+            return result, index, False
+        # Keep partially salvaged containers so their complete elements survive
+        result[key] = value
+        if not complete:
+            return result, index, False
+
+
+def _parse_array(text: str, index: int) -> Tuple[List, int, bool]:
+    result = PartialList()
+    while True:
+        index = _skip_whitespace(text, index)
+        if index >= len(text):
+            return result, index, False
+        if text[index] == ']':
+            return list(result), index + 1, True
+        if text[index] == ',':
+            index += 1
+            continue
+        try:
+            value, index, complete = _parse_value(text, index)
+        except _Truncated:
+            return result, index, False
+        # Incomplete elements are dropped, only whole items are salvaged
+        if not complete:
+            return result, index, False
+        result.append(value)
+
+
+def repair_json(text: str) -> Tuple[Any, bool]:
+    """
+    Parse possibly truncated or malformed JSON.
+
+    Returns the salvaged value and whether the input was complete. Objects keep
+    every fully parsed member and arrays keep every fully parsed element; the
+    first incomplete or malformed piece and everything after it is discarded.
+    Containers that were cut short are returned as `PartialDict`/`PartialList`.
+    """
+    if not text:
+        return None, False
+    try:
+        return json.loads(text), True
+    except json.JSONDecodeError:
+        pass
+
+    # Skip any prose or markdown fences before the first container
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None, False
+    try:
+        value, _, complete = _parse_value(text, min(starts))
+    except _Truncated:
+        return None, False
+    return value, complete
+
+
+def bind_schema(llm, name: str, description: str, parameters: Dict):
+    """Bind a function schema to the LLM and force it to be called"""
+    return llm.bind(
+        tools=[{
+            "type": "function",
+            "function": {"name": name, "description": description, "parameters": parameters}
+        }],
+        tool_choice={"type": "function", "function": {"name": name}}
+    )
+
+
+def extract_arguments(response) -> str:
+    """Return the raw arguments of the first tool call, falling back to the message content"""
+    tool_calls = getattr(response, 'additional_kwargs', {}).get("tool_calls") or []
+    if tool_calls:
+        return tool_calls[0].get("function", {}).get("arguments", "")
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+def invoke_with_repair(llm,
+                       messages: List,
+                       merge: Callable[[Any, Dict], None],
+                       missing: Callable[[Dict], List[str]],
+                       retry_instruction: Callable[[Dict, List[str]], str],
+                       max_repair_requests: int = 2,
+                       request_timeout: Optional[float] = None) -> Tuple[Dict, List[str]]:
+    """
+    Invoke a schema-bound LLM and re-request only the pieces that are missing.
+
+    `merge` folds the salvaged output of a response into the collected result,
+    `missing` lists what is still absent and `retry_instruction` phrases the
+    follow-up request for those pieces. Returns the collected result and
+    whatever is still missing after the last attempt.
+    
+    Each request is checked against the budget of the current run and its
+    timeout is clamped to the time the run has left.
+    """
+    collected: Dict = {}
+    outstanding: List[str] = []
+    request = messages
+    for attempt in range(max_repair_requests + 1):
+        check_budget()
+        budget = current_budget.get()
+        timeout = budget.timeout_for(request_timeout) if budget is not None else request_timeout
+        bound_llm = llm.bind(timeout=timeout) if timeout is not None else llm
+        response = bound_llm.invoke(request, config={"callbacks": budget_callbacks()})
+        data, complete = repair_json(extract_arguments(response))
+        if not complete:
+            logger.warning(f"Structured output was incomplete on attempt {attempt + 1}, salvaging")
+        if isinstance(data, dict):
+            merge(data, collected)
+
+        outstanding = missing(collected)
+        if not outstanding:
+            break
+        logger.info(f"Re-requesting missing pieces: {', '.join(outstanding)}")
+        request = messages + [HumanMessage(content=retry_instruction(collected, outstanding))]
+    return collected, outstanding
+
+
+def missing_sections(sections: List[str]) -> Callable[[Dict], List[str]]:
+    """Build a `missing` callback for a fixed set of required top-level sections"""
+    return lambda collected: [section for section in sections if section not in collected]
+
+
+def merge_sections(sections: List[str]) -> Callable[[Any, Dict], None]:
+    """Build a `merge` callback that keeps the first complete value of each section"""
+    def merge(data: Dict, collected: Dict) -> None:
+        for section in sections:
+            if section in data and section not in collected and not is_partial(data[section]):
+                collected[section] = data[section]
+    return merge
+
+
+def sections_retry_instruction(collected: Dict, outstanding: List[str]) -> str:
+    return (
+        f"Your previous response was incomplete. The sections {', '.join(sorted(collected))} were received. "
+        f"Call the function again and return only these missing sections: {', '.join(outstanding)}."
+    )
@@ -1,26 +1,94 @@
 from langchain.tools import BaseTool
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from typing import Dict
-import json
+from typing import Dict, Optional
 import logging
 from pydantic import Field, PrivateAttr
 
+from ..budget import BudgetExceededError, run_tool
+from .structured_output import (
+    bind_schema,
+    invoke_with_repair,
+    merge_sections,
+    missing_sections,
+    sections_retry_instruction
+)
+
 logger = logging.getLogger(__name__)
 
+TEMPLATE_SECTIONS = [
+    "directory_structure",
+    "architectural_layers",
+    "key_components",
+    "implementation_guidelines"
+]
+
+TEMPLATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "directory_structure": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Directory paths of the project"
+        },
+        "architectural_layers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["name", "description"]
+            }
+        },
+        "key_components": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "layer": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["name", "description"]
+            }
+        },
+        "implementation_guidelines": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    },
+    "required": TEMPLATE_SECTIONS
+}
+
 class ParseTemplateTool(BaseTool):
     name: str = "parse_template"
     description: str = "Parse the template text to extract directory structure and architectural requirements"
     
-    def __init__(self, model_name: str, openai_api_key: str, **data):
+    def __init__(self,
+                 model_name: str,
+                 openai_api_key: str,
+                 max_repair_requests: int = 2,
+                 request_timeout: Optional[float] = None,
+                 **data):
         super().__init__(**data)
         # Initialize private attributes before using them
         object.__setattr__(self, '_model_name', model_name)
         object.__setattr__(self, '_openai_api_key', openai_api_key)
+        object.__setattr__(self, '_max_repair_requests', max_repair_requests)
+        object.__setattr__(self, '_request_timeout', request_timeout)
         object.__setattr__(self, '_llm', ChatOpenAI(
             model_name=model_name,
             openai_api_key=openai_api_key,
-            temperature=0.1
+            temperature=0.1,
+            request_timeout=request_timeout
+        ))
+        object.__setattr__(self, '_structured_llm', bind_schema(
+            self._llm,
+            "describe_template",
+            "Return the structure extracted from the project template",
+            TEMPLATE_SCHEMA
         ))
     
     def _run(self, template: str) -> str:
@@ -37,28 +105,33 @@ class ParseTemplateTool(BaseTool):
                 Template:
                 {template}
                 
-                Return a JSON object with these sections structured for easy parsing.
+                Return these sections by calling describe_template.
                 """)
             ])
             
-            # Use invoke instead of predict_messages
-            response = self._llm.invoke(
-                prompt.format_messages(template=template)
+            structure, outstanding = invoke_with_repair(
+                self._structured_llm,
+                prompt.format_messages(template=template),
+                merge=merge_sections(TEMPLATE_SECTIONS),
+                missing=missing_sections(TEMPLATE_SECTIONS),
+                retry_instruction=sections_retry_instruction,
+                max_repair_requests=self._max_repair_requests,
+                request_timeout=self._request_timeout
             )
             
-            try:
-                # Extract the content from the response
-                content = response.content if hasattr(response, 'content') else str(response)
-                # Try to parse as JSON
-                return json.loads(content)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse LLM response as JSON: {e}")
+            if not structure:
+                logger.error("Failed to salvage any template structure from the LLM response")
                 # Return a structured error response instead of raw JSON
                 return {
                     "error": "Failed to parse template structure",
-                    "raw_response": content
+                    "raw_response": None
                 }
+            if outstanding:
+                structure["missing_sections"] = outstanding
+            return structure
             
+        except BudgetExceededError:
+            raise
         except Exception as e:
             logger.error(f"Error parsing template: {str(e)}")
             return {
@@ -67,5 +140,5 @@ class ParseTemplateTool(BaseTool):
             }
     
     async def _arun(self, template: str) -> str:
-        # For synchronous operations, we can just return the _run result
-        return self._run(template) 
\ No newline at end of file
+        # Run the blocking LLM calls in a worker thread, bounded by the per-tool timeout
+        return await run_tool(self.name, self._run, template) 
\ No newline at end of file
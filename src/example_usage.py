@@ -180,17 +180,17 @@ async def main():
         
     try:
         # Create repository
-        success = await agent.create_repository(
+        result = await agent.create_repository(
             requirements=requirements,
             language="python",
             repo_path=Path("./generated/user-service"),
             remote_url=None  # Set this if you want to push to a remote repository
         )
         
-        if success:
+        if result:
             logger.info("Repository created successfully!")
         else:
-            logger.error("Failed to create repository")
+            logger.error(f"Failed to create repository: {result.cause}")
             
     except Exception as e:
         logger.error(f"Error during repository creation: {str(e)}")
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.budget import (
+    BudgetExceededError,
+    RunBudget,
+    RunResult,
+    ToolTimeoutError,
+    current_budget,
+    check_budget,
+    run_tool
+)
+
+
+def _slow_tool(steps: int = 40, delay: float = 0.05) -> str:
+    for _ in range(steps):
+        check_budget()
+        time.sleep(delay)
+    return "done"
+
+
+async def _run_in_budget(budget: RunBudget, *args):
+    token = current_budget.set(budget)
+    try:
+        return await run_tool("slow", _slow_tool, *args)
+    finally:
+        current_budget.reset(token)
+
+
+def test_run_result_truthiness():
+    assert RunResult(success=True)
+    assert not RunResult(success=False, timed_out=True, cause="deadline exceeded")
+
+
+def test_token_budget_is_shared_with_children():
+    budget = RunBudget(token_budget=10)
+    budget.child().charge(12)
+    with pytest.raises(BudgetExceededError) as error:
+        budget.check()
+    assert "token budget" in error.value.cause
+
+
+def test_child_stops_with_cancelled_parent():
+    budget = RunBudget()
+    child = budget.child()
+    budget.cancel("stopped")
+    with pytest.raises(BudgetExceededError):
+        child.check()
+    assert child.cause == "stopped"
+
+
+def test_timeout_for_clamps_to_remaining_time():
+    assert RunBudget().timeout_for(5) == 5
+    assert RunBudget().timeout_for() is None
+    assert RunBudget(timeout=1).timeout_for(5) <= 1
+
+
+def test_run_tool_without_budget_runs_to_completion():
+    assert asyncio.run(run_tool("slow", _slow_tool, 2, 0)) == "done"
+
+
+def test_run_tool_raises_tool_timeout_and_cancels_worker():
+    budget = RunBudget(timeout=10, tool_timeout=0.1)
+    with pytest.raises(ToolTimeoutError):
+        asyncio.run(_run_in_budget(budget))
+    # The worker stops at its next budget check
+    assert budget.wait_for_workers(1)
+    # A single tool timing out does not end the run
+    budget.check()
+
+
+def test_run_tool_raises_budget_exceeded_on_run_deadline():
+    budget = RunBudget(timeout=0.1, tool_timeout=10)
+    with pytest.raises(BudgetExceededError):
+        asyncio.run(_run_in_budget(budget))
+    assert budget.wait_for_workers(1)
+
+
+def test_wait_for_workers_reports_running_workers():
+    budget = RunBudget()
+    done = threading.Event()
+    budget.track_worker(done)
+    assert not budget.wait_for_workers(0.05)
+    done.set()
+    assert budget.wait_for_workers(0.05)
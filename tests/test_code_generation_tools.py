@@ -0,0 +1,7 @@
+from agent.tools.code_generation_tools import _detect_language
+
+
+def test_detect_language_picks_dominant_extension():
+    assert _detect_language({"src/Domain/User.cs": "", "src/Api/Program.cs": "", "setup.py": ""}) == "C#"
+    assert _detect_language({"src/main.py": "", "Dockerfile": ""}) == "Python"
+    assert _detect_language({"Dockerfile": ""}) == "software"
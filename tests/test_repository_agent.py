@@ -0,0 +1,170 @@
+import asyncio
+import subprocess
+import time
+
+import pytest
+
+from agent.budget import RunResult, check_budget
+from agent.repository_agent import RepositoryAgent
+
+
+def _git(path, *args):
+    subprocess.run(["git", *args], cwd=path, check=True, capture_output=True)
+
+
+def _files(path):
+    return sorted(p.relative_to(path).as_posix() for p in path.rglob("*") if p.is_file() and ".git" not in p.parts)
+
+
+@pytest.fixture
+def agent():
+    return RepositoryAgent(openai_api_key="test", index_dir=None)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    _git(path, "init", "-q")
+    _git(path, "config", "user.email", "test@example.com")
+    _git(path, "config", "user.name", "test")
+    (path / "app.py").write_text("v1")
+    (path / "notes.txt").write_text("v1")
+    _git(path, "add", "-A")
+    _git(path, "commit", "-qm", "initial")
+    return path
+
+
+def test_rollback_removes_repository_created_by_run(agent, tmp_path):
+    path = tmp_path / "new"
+    snapshot = agent._snapshot_repository(path)
+    assert snapshot is None
+
+    path.mkdir()
+    _git(path, "init", "-q")
+    (path / "main.py").write_text("x")
+    _git(path, "add", "main.py")
+
+    agent._rollback_repository(path, snapshot)
+    assert not path.exists()
+
+
+def test_rollback_removes_directory_created_before_init(agent, tmp_path):
+    path = tmp_path / "new"
+    snapshot = agent._snapshot_repository(path)
+    (path / "src").mkdir(parents=True)
+    (path / "src" / "main.py").write_text("x")
+
+    agent._rollback_repository(path, snapshot)
+    assert not path.exists()
+
+
+def test_rollback_keeps_user_changes_in_existing_repository(agent, repo):
+    (repo / "notes.txt").write_text("user edit")
+    (repo / "todo.txt").write_text("user file")
+    snapshot = agent._snapshot_repository(repo)
+
+    (repo / "app.py").write_text("run edit")
+    agent._rollback_repository(repo, snapshot)
+
+    assert (repo / "notes.txt").read_text() == "user edit"
+    assert (repo / "todo.txt").read_text() == "user file"
+    assert (repo / "app.py").read_text() == "v1"
+
+
+def test_rollback_removes_uncommitted_files_added_by_run(agent, repo):
+    snapshot = agent._snapshot_repository(repo)
+
+    (repo / "committed.py").write_text("c")
+    _git(repo, "add", "committed.py")
+    _git(repo, "commit", "-qm", "run")
+    (repo / "staged.py").write_text("s")
+    _git(repo, "add", "staged.py")
+    (repo / "untracked.py").write_text("u")
+
+    agent._rollback_repository(repo, snapshot)
+    assert _files(repo) == ["app.py", "committed.py", "notes.txt"]
+
+
+class _FakeRequirementsTool:
+    name = "analyze_requirements"
+
+    def __init__(self, run):
+        self.calls = 0
+        self._run_func = run
+
+    def _run(self, requirements):
+        self.calls += 1
+        return self._run_func(requirements)
+
+
+def _multi_target_agent(monkeypatch, analyze, create=None, **fields):
+    agent = RepositoryAgent(openai_api_key="test", index_dir=None, **fields)
+    tool = _FakeRequirementsTool(analyze)
+    object.__setattr__(agent, '_requirements_tool', tool)
+    received = {}
+
+    async def create_repository(self, agent_executor, budget, requirements, language, repo_path, remote_url, domain_model):
+        received[language] = domain_model
+        if create is not None:
+            return await create(language)
+        return RunResult(success=True)
+
+    monkeypatch.setattr(RepositoryAgent, "_build_agent_executor", lambda self, memory: None)
+    monkeypatch.setattr(RepositoryAgent, "_create_repository", create_repository)
+    return agent, tool, received
+
+
+def test_create_repositories_analyzes_once_for_all_targets(monkeypatch, tmp_path):
+    model = {"name": "user-service", "entities": []}
+    agent, tool, received = _multi_target_agent(monkeypatch, lambda requirements: model)
+
+    results = asyncio.run(agent.create_repositories({"name": "user-service"}, ["python", "csharp"], tmp_path))
+
+    assert tool.calls == 1
+    assert received == {"python": model, "csharp": model}
+    assert all(results.values())
+
+
+def test_create_repositories_falls_back_when_analysis_fails(monkeypatch, tmp_path):
+    agent, _, received = _multi_target_agent(monkeypatch, lambda requirements: {"error": "Failed to analyze requirements"})
+
+    results = asyncio.run(agent.create_repositories({}, ["python", "csharp"], tmp_path))
+
+    assert received == {"python": None, "csharp": None}
+    assert all(results.values())
+
+
+def test_create_repositories_falls_back_when_analysis_times_out(monkeypatch, tmp_path):
+    def slow_analysis(requirements):
+        while True:
+            check_budget()
+            time.sleep(0.01)
+
+    agent, _, received = _multi_target_agent(monkeypatch, slow_analysis, tool_timeout=0.1)
+
+    results = asyncio.run(agent.create_repositories({}, ["python"], tmp_path))
+
+    assert received == {"python": None}
+    assert results["python"]
+
+
+def test_create_repositories_isolates_failing_targets(monkeypatch, tmp_path):
+    async def create(language):
+        if language == "csharp":
+            raise RuntimeError("generation failed")
+        if language == "go":
+            raise asyncio.CancelledError()
+        return RunResult(success=True)
+
+    agent, _, _ = _multi_target_agent(monkeypatch, lambda requirements: {"name": "svc"}, create)
+
+    results = asyncio.run(agent.create_repositories({}, ["python", "csharp", "go"], tmp_path))
+
+    assert results["python"]
+    assert results["csharp"].cause == "generation failed"
+    assert not results["go"] and results["go"].cause == "CancelledError"
+
+
+def test_requirements_analysis_is_not_an_agent_tool(agent):
+    assert "analyze_requirements" not in [tool.name for tool in agent._tools]
@@ -0,0 +1,117 @@
+from agent.spec_index import SpecIndex, format_reference, normalize_requirements
+
+REQUIREMENTS = """
+## User Service
+A REST API microservice for user management built with FastAPI and PostgreSQL.
+1. List users (GET /api/users) with pagination using page and page_size parameters.
+2. Get a user by id (GET /api/users/{user_id}) returning the user details.
+3. Create a user (POST /api/users) with a unique username and a valid unique email.
+4. Update a user (PUT /api/users/{user_id}) with optional username and email.
+5. Delete a user (DELETE /api/users/{user_id}) returning 204 No Content.
+The User entity has id, username, email and created_at attributes.
+"""
+
+UNRELATED = """
+## Invoice Service
+Generates monthly invoices from billing records and sends them to customers by email,
+tracks payment status, applies late fees and exports accounting reports as CSV files.
+"""
+
+
+def test_normalize_requirements_is_case_and_punctuation_insensitive():
+    assert normalize_requirements("Create  a USER, now!") == normalize_requirements("create a user now")
+    assert normalize_requirements({"b": 1, "a": 2}) == normalize_requirements({"a": 2, "b": 1})
+
+
+def test_query_finds_near_duplicate(tmp_path):
+    index = SpecIndex(tmp_path)
+    entry_id = index.add(REQUIREMENTS, "python", {"main.py": "print('hi')"})
+
+    match = index.query(REQUIREMENTS.replace("FastAPI", "FastAPI framework"), "python")
+    assert match is not None
+    assert match[0] == entry_id
+    assert match[1] > 0.6
+
+    assert index.query(REQUIREMENTS, "python") == (entry_id, 1.0)
+
+
+def test_query_ignores_unrelated_specs(tmp_path):
+    index = SpecIndex(tmp_path)
+    index.add(REQUIREMENTS, "python", {"main.py": ""})
+    match = index.query(UNRELATED, "python")
+    assert match is None or match[1] < 0.3
+
+
+def test_query_filters_by_language(tmp_path):
+    index = SpecIndex(tmp_path)
+    index.add(REQUIREMENTS, "python", {"main.py": ""})
+    assert index.query(REQUIREMENTS, "csharp") is None
+    assert index.query(REQUIREMENTS, "Python") is not None
+
+
+def test_add_deduplicates_identical_specs(tmp_path):
+    index = SpecIndex(tmp_path)
+    first = index.add(REQUIREMENTS, "python", {"main.py": "v1"})
+    second = index.add(REQUIREMENTS, "python", {"main.py": "v2"})
+    assert first == second
+    assert len(index) == 1
+    assert len(list((tmp_path / "projects").iterdir())) == 1
+    assert index.load_files(first) == {"main.py": "v1"}
+
+
+def test_find_exact_requires_same_requirements_language_and_template(tmp_path):
+    index = SpecIndex(tmp_path)
+    entry_id = index.add(REQUIREMENTS, "python", {"main.py": ""}, template="layout v1")
+
+    assert index.find_exact(REQUIREMENTS.upper(), "Python", "layout v1") == entry_id
+    assert index.find_exact(REQUIREMENTS, "python", "layout v2") is None
+    assert index.find_exact(REQUIREMENTS, "csharp", "layout v1") is None
+
+
+def test_one_word_technology_change_is_only_a_reference(tmp_path):
+    index = SpecIndex(tmp_path)
+    entry_id = index.add(REQUIREMENTS, "python", {"main.py": ""})
+    changed = REQUIREMENTS.replace("PostgreSQL", "MySQL")
+
+    # Close enough to serve as a reference, but never reused as is
+    assert index.query(changed, "python")[0] == entry_id
+    assert index.find_exact(changed, "python") is None
+    assert index.add(changed, "python", {"main.py": ""}) != entry_id
+
+
+def test_entries_persist_across_reloads(tmp_path):
+    entry_id = SpecIndex(tmp_path).add(REQUIREMENTS, "python", {"main.py": "print('hi')"})
+
+    reloaded = SpecIndex(tmp_path)
+    assert len(reloaded) == 1
+    assert reloaded.query(REQUIREMENTS, "python") == (entry_id, 1.0)
+    assert reloaded.load_files(entry_id) == {"main.py": "print('hi')"}
+
+
+def test_entries_from_other_workers_are_picked_up(tmp_path):
+    reader = SpecIndex(tmp_path)
+    writer = SpecIndex(tmp_path)
+    entry_id = writer.add(REQUIREMENTS, "python", {"main.py": ""})
+    assert reader.query(REQUIREMENTS, "python") == (entry_id, 1.0)
+
+
+def test_incomplete_log_line_is_ignored_until_finished(tmp_path):
+    index = SpecIndex(tmp_path)
+    index.add(REQUIREMENTS, "python", {"main.py": ""})
+    with open(tmp_path / "index.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "partial", "language": "py')
+
+    reloaded = SpecIndex(tmp_path)
+    assert len(reloaded) == 1
+
+
+def test_load_files_of_unknown_entry(tmp_path):
+    assert SpecIndex(tmp_path).load_files("missing") == {}
+
+
+def test_format_reference_respects_budget():
+    files = {"a.py": "a" * 50, "b.py": "b" * 5000}
+    reference = format_reference(files, max_chars=500)
+    assert "- a.py" in reference and "- b.py" in reference
+    assert "a" * 50 in reference
+    assert "b" * 5000 not in reference
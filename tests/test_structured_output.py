@@ -0,0 +1,119 @@
+import json
+
+from agent.tools.code_generation_tools import _files_retry_instruction, _merge_files, _missing_files
+from agent.tools.structured_output import is_partial, merge_sections, missing_sections, repair_json
+
+
+def test_repair_json_complete_input():
+    assert repair_json('{"readme": "hi", "architecture": "ok"}') == ({"readme": "hi", "architecture": "ok"}, True)
+
+
+def test_repair_json_empty_or_without_json():
+    assert repair_json("") == (None, False)
+    assert repair_json("no json here") == (None, False)
+
+
+def test_repair_json_fenced_output():
+    value, complete = repair_json('Sure!\n```json\n{"readme": "hi", "architecture": "ok"}\n```')
+    assert value == {"readme": "hi", "architecture": "ok"}
+    assert complete
+
+
+def test_repair_json_drops_truncated_string():
+    value, complete = repair_json('{"readme": "hi", "architecture": "cut sho')
+    assert value == {"readme": "hi"}
+    assert not complete
+
+
+def test_repair_json_drops_truncated_key():
+    value, complete = repair_json('{"readme": "hi", "archi')
+    assert value == {"readme": "hi"}
+    assert not complete
+
+
+def test_repair_json_keeps_complete_array_elements():
+    value, complete = repair_json('{"files": [{"path": "a.py", "content": "A"}, {"path": "b.py", "cont')
+    assert value == {"files": [{"path": "a.py", "content": "A"}]}
+    assert is_partial(value) and is_partial(value["files"])
+    assert not complete
+
+
+def test_repair_json_nested_partial_object():
+    value, complete = repair_json('{"a": {"b": [1, 2], "c": {"d": "x"')
+    assert value == {"a": {"b": [1, 2], "c": {"d": "x"}}}
+    assert is_partial(value["a"]) and not is_partial(value["a"]["b"])
+    assert not complete
+
+
+def test_repair_json_treats_trailing_number_as_truncated():
+    assert repair_json("[1,2,3") == ([1, 2], False)
+    assert repair_json('{"n": 12') == ({}, False)
+    assert repair_json('{"n": 12}') == ({"n": 12}, True)
+
+
+def test_repair_json_stops_at_malformed_piece():
+    value, complete = repair_json('{"a": 1, "b": oops, "c": 3}')
+    assert value == {"a": 1}
+    assert not complete
+
+
+def test_merge_sections_skips_partial_values():
+    sections = ["readme", "architecture"]
+    merge = merge_sections(sections)
+    missing = missing_sections(sections)
+    collected = {}
+
+    data, _ = repair_json('{"readme": "hi", "architecture": {"layers": ["domain"')
+    merge(data, collected)
+    assert collected == {"readme": "hi"}
+    assert missing(collected) == ["architecture"]
+
+    merge({"readme": "other", "architecture": "ok"}, collected)
+    assert collected == {"readme": "hi", "architecture": "ok"}
+    assert missing(collected) == []
+
+
+def test_merge_files_salvages_and_reports_missing_files():
+    full = json.dumps({
+        "manifest": ["a.py", "b.py", "c.py"],
+        "files": [
+            {"path": "a.py", "content": "A"},
+            {"path": "b.py", "content": "B"},
+            {"path": "c.py", "content": "C"}
+        ]
+    })
+    data, complete = repair_json(full[:full.index('"c.py", "content"') + 3])
+    assert not complete
+
+    collected = {}
+    _merge_files(data, collected)
+    assert collected["files"] == {"a.py": "A", "b.py": "B"}
+    assert _missing_files(collected) == ["c.py"]
+    assert "c.py" in _files_retry_instruction(collected, ["c.py"])
+
+    _merge_files({"manifest": ["c.py"], "files": [{"path": "c.py", "content": "C"}]}, collected)
+    assert collected["manifest"] == ["a.py", "b.py", "c.py"]
+    assert _missing_files(collected) == []
+
+
+def test_partial_manifest_requests_rest_of_manifest():
+    data, complete = repair_json('{"manifest": ["a.py", "b.py", "c.p')
+    assert not complete
+
+    collected = {}
+    _merge_files(data, collected)
+    assert _missing_files(collected) == ["<manifest>", "a.py", "b.py"]
+    assert "complete manifest" in _files_retry_instruction(collected, _missing_files(collected))
+
+    _merge_files({
+        "manifest": ["a.py", "b.py", "c.py"],
+        "files": [{"path": "a.py", "content": "A"}, {"path": "b.py", "content": "B"}]
+    }, collected)
+    assert _missing_files(collected) == ["c.py"]
+
+
+def test_missing_files_requests_whole_project_when_nothing_salvaged():
+    collected = {}
+    _merge_files({}, collected)
+    assert _missing_files(collected) == ["*"]
+    assert "complete project" in _files_retry_instruction(collected, ["*"])